@@ -0,0 +1,170 @@
+"""Minimal keep-alive JSON-RPC client for PEPEPOWd.
+
+The PEPEPOW contrib scripts use this instead of spawning PEPEPOW-cli once per
+call: a single HTTP/1.1 connection is reused for every request, and
+``CoreRPC.batch`` sends many calls in one round trip.
+"""
+
+import base64
+import http.client
+import json
+import os
+from typing import Optional, Sequence, Tuple
+from urllib.parse import unquote, urlsplit
+
+from electrumx.lib.coins import Pepepow
+
+
+CONF_NAME = "PEPEPOW.conf"
+COOKIE_NAME = ".cookie"
+
+
+class CoreRPCError(RuntimeError):
+    """Raised when PEPEPOWd returns an error or an unusable reply."""
+
+
+def read_core_conf(datadir: str) -> dict:
+    """Return the top-level settings of ``{datadir}/PEPEPOW.conf``.
+
+    Network sections are ignored and the first value of a repeated key wins.
+    """
+    settings = {}
+    with open(os.path.join(datadir, CONF_NAME), encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line.startswith("["):
+                break
+            if "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            settings.setdefault(key.strip(), value.strip())
+    return settings
+
+
+class CoreRPC:
+    """JSON-RPC client holding one persistent connection to PEPEPOWd.
+
+    Not thread-safe; use one instance per thread.
+    """
+
+    def __init__(self, host: str, port: int, user: str, password: str,
+                 timeout: float = 60.0):
+        self._host = host
+        self._port = port
+        self._timeout = timeout
+        auth = base64.b64encode(f"{user}:{password}".encode("utf-8")).decode("ascii")
+        self._headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Basic {auth}",
+        }
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _post(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(
+                    self._host, self._port, timeout=self._timeout
+                )
+            try:
+                self._conn.request("POST", "/", body, self._headers)
+                resp = self._conn.getresponse()
+                data = resp.read()
+                break
+            except ConnectionError:
+                # PEPEPOWd drops idle keep-alive connections; reconnect once.
+                self.close()
+                if attempt:
+                    raise
+        if resp.status == 401:
+            raise CoreRPCError("PEPEPOWd rejected the RPC credentials")
+        try:
+            return json.loads(data)
+        except ValueError as exc:
+            raise CoreRPCError(f"HTTP {resp.status} from PEPEPOWd: {data[:200]!r}") from exc
+
+    def call(self, method: str, *params):
+        reply = self._post({"jsonrpc": "1.0", "id": 0, "method": method, "params": list(params)})
+        if reply.get("error") is not None:
+            raise CoreRPCError(f"core {method} returned error: {reply['error']}")
+        return reply.get("result")
+
+    def batch(self, calls: Sequence[Tuple[str, list]]) -> list:
+        """Send (method, params) calls as one JSON-RPC batch.
+
+        Returns the results in call order.
+        """
+        if not calls:
+            return []
+        replies = self._post([
+            {"jsonrpc": "1.0", "id": idx, "method": method, "params": params}
+            for idx, (method, params) in enumerate(calls)
+        ])
+        if not isinstance(replies, list):
+            raise CoreRPCError(f"unexpected batch reply from PEPEPOWd: {replies!r}")
+        by_id = {reply.get("id"): reply for reply in replies}
+
+        results = []
+        for idx, (method, _params) in enumerate(calls):
+            reply = by_id.get(idx)
+            if reply is None:
+                raise CoreRPCError(f"no core response for {method} (id {idx})")
+            if reply.get("error") is not None:
+                raise CoreRPCError(f"core {method} returned error: {reply['error']}")
+            results.append(reply.get("result"))
+        return results
+
+
+def connect_core_rpc(
+    datadir: str,
+    url: Optional[str] = None,
+    user: Optional[str] = None,
+    password: Optional[str] = None,
+    timeout: float = 60.0,
+) -> CoreRPC:
+    """Build a CoreRPC from explicit settings, falling back to the datadir.
+
+    ``url`` must be a plain ``http://[user:password@]host[:port]`` URL; its
+    credentials are used when none are passed explicitly. Missing settings
+    are taken from PEPEPOW.conf (rpcconnect, rpcport, rpcuser, rpcpassword),
+    and credentials from the .cookie file when the conf has none.
+    """
+    try:
+        conf = read_core_conf(datadir)
+    except FileNotFoundError:
+        conf = {}
+
+    if url:
+        parts = urlsplit(url)
+        if parts.scheme != "http":
+            raise CoreRPCError(f"unsupported core RPC URL scheme {parts.scheme!r}: use http://")
+        if parts.path not in ("", "/") or parts.query or parts.fragment:
+            raise CoreRPCError(f"core RPC URL must not have a path or query: {url}")
+        host = parts.hostname or "127.0.0.1"
+        port = parts.port or Pepepow.RPC_PORT
+        if parts.username:
+            user = user or unquote(parts.username)
+        if parts.password:
+            password = password or unquote(parts.password)
+    else:
+        host = conf.get("rpcconnect", "127.0.0.1")
+        port = int(conf.get("rpcport", Pepepow.RPC_PORT))
+
+    user = user or conf.get("rpcuser")
+    password = password or conf.get("rpcpassword")
+    if not (user and password):
+        try:
+            with open(os.path.join(datadir, COOKIE_NAME), encoding="utf-8") as f:
+                user, _, password = f.read().strip().partition(":")
+        except FileNotFoundError:
+            raise CoreRPCError(
+                f"no RPC credentials: pass them explicitly or set rpcuser/rpcpassword "
+                f"in {os.path.join(datadir, CONF_NAME)}"
+            ) from None
+
+    return CoreRPC(host, port, user, password, timeout=timeout)
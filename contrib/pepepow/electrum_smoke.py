@@ -1,20 +1,52 @@
 #!/usr/bin/env python3
+"""Smoke-check a PEPEPOW ElectrumX server against PEPEPOW Core.
+
+Optional dependency: if ``orjson`` is installed it is used to encode and
+decode Electrum and PEPEPOW-cli JSON; otherwise the stdlib ``json`` module is
+used.
+"""
 
 import argparse
+import functools
 import json
 import socket
 import subprocess
 from decimal import Decimal
 from hashlib import sha256
 
+try:
+    import orjson
+except ImportError:  # optional; fall back to stdlib json
+    orjson = None
+
 from electrumx.lib.coins import Pepepow
 
+from _rpc import connect_core_rpc
+
+
+DEFAULT_ADDRESS = "PGZrJkuJU39AqPfJQ2Rcpng9ChLwgybMHh"
+
+
+if orjson is not None:
+    json_loads = orjson.loads
+
+    def json_line(obj) -> bytes:
+        return orjson.dumps(obj) + b"\n"
+else:
+    json_loads = json.loads
+
+    def json_line(obj) -> bytes:
+        return (json.dumps(obj) + "\n").encode("utf-8")
+
 
 class ElectrumClient:
     def __init__(self, host: str, port: int, timeout: float = 15.0):
         self._sock = socket.create_connection((host, port), timeout=timeout)
         self._sock.settimeout(timeout)
-        self._file = self._sock.makefile("rwb")
+        # Requests are small and latency-bound; don't let Nagle hold them back.
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # listunspent/get_history replies can be large; read them in big chunks.
+        self._file = self._sock.makefile("rwb", buffering=65536)
         self._next_id = 1
 
     def close(self):
@@ -27,15 +59,54 @@ class ElectrumClient:
         req_id = self._next_id
         self._next_id += 1
         payload = {"jsonrpc": "2.0", "id": req_id, "method": method, "params": params}
-        self._file.write((json.dumps(payload) + "\n").encode("utf-8"))
+        self._file.write(json_line(payload))
         self._file.flush()
 
         line = self._file.readline()
         if not line:
             raise RuntimeError(f"no response for {method}")
-        resp = json.loads(line.decode("utf-8"))
+        resp = json_loads(line)
         if resp.get("id") != req_id:
             raise RuntimeError(f"id mismatch for {method}: {resp}")
+        return self._check_response(method, resp, expect_error)
+
+    def request_many(self, calls):
+        """Pipeline (method, params) calls and return the responses in call order.
+
+        All requests are written before any response is read, so independent
+        queries cost one round trip instead of one each.
+        """
+        methods = {}
+        lines = []
+        for method, params in calls:
+            req_id = self._next_id
+            self._next_id += 1
+            methods[req_id] = method
+            payload = {"jsonrpc": "2.0", "id": req_id, "method": method, "params": params}
+            lines.append(json_line(payload))
+        self._file.write(b"".join(lines))
+        self._file.flush()
+
+        responses = {}
+        while len(responses) < len(methods):
+            line = self._file.readline()
+            if not line:
+                missing = [m for i, m in methods.items() if i not in responses]
+                raise RuntimeError(f"no response for {', '.join(missing)}")
+            resp = json_loads(line)
+            req_id = resp.get("id")
+            if req_id is None:
+                # Subscription notification; not an answer to any request.
+                continue
+            if req_id not in methods or req_id in responses:
+                raise RuntimeError(f"unexpected response id: {resp}")
+            responses[req_id] = resp
+
+        return [self._check_response(methods[req_id], responses[req_id], False)
+                for req_id in methods]
+
+    @staticmethod
+    def _check_response(method: str, resp, expect_error: bool):
         if resp.get("error") is not None:
             if expect_error:
                 return resp
@@ -47,59 +118,159 @@ class ElectrumClient:
 
 def run_cli_json(cli_path: str, datadir: str, *args):
     cmd = [cli_path, f"-datadir={datadir}", *args]
-    out = subprocess.check_output(cmd, text=True, timeout=20).strip()
-    if out and out[0] in "{[":
-        return json.loads(out)
-    if out in ("true", "false", "null"):
-        return json.loads(out)
-    if out and out[0] == '"':
-        return json.loads(out)
-    return out
+    # Keep the output as bytes: both parsers accept it without a decode pass.
+    out = subprocess.check_output(cmd, timeout=20).strip()
+    if out[:1] in (b"{", b"[", b'"') or out in (b"true", b"false", b"null"):
+        return json_loads(out)
+    return out.decode("utf-8")
 
 
 def satoshis(value):
     return int((Decimal(str(value)) * Decimal(100_000_000)).to_integral_value())
 
 
-def address_to_scripthash(address: str) -> str:
-    script = Pepepow.pay_to_address_script(address)
-    return sha256(script).digest()[::-1].hex()
+def digest_to_scripthash(digest: bytes) -> str:
+    # Electrum scripthashes are the script's sha256 in reversed byte order.
+    return digest[::-1].hex()
+
+
+@functools.lru_cache(maxsize=4096)
+def script_for_address(address: str) -> bytes:
+    return Pepepow.pay_to_address_script(address)
+
+
+def address_script_digest(address: str) -> bytes:
+    return sha256(script_for_address(address)).digest()
+
+
+def fetch_txouts(args, rpc, listunspent):
+    if rpc is None:
+        return [
+            run_cli_json(args.cli, args.datadir, "gettxout", utxo["tx_hash"],
+                         str(utxo["tx_pos"]), "true")
+            for utxo in listunspent
+        ]
+    return rpc.batch([
+        ("gettxout", [utxo["tx_hash"], utxo["tx_pos"], True]) for utxo in listunspent
+    ])
+
+
+def check_address(client, args, rpc, address, balance, listunspent, history):
+    scripthash = digest_to_scripthash(address_script_digest(address))
+
+    if not listunspent and not history:
+        raise RuntimeError(f"expected at least one listunspent/history entry for {address}")
+
+    if history:
+        txid = history[0]["tx_hash"]
+    else:
+        txid = listunspent[0]["tx_hash"]
+
+    tx_raw = client.request("blockchain.transaction.get", [txid])["result"]
+    if not isinstance(tx_raw, str) or not tx_raw:
+        raise RuntimeError("blockchain.transaction.get returned invalid payload")
+
+    confirmed_from_utxos = 0
+    # Matching scripts have matching scripthashes, so compare the script hex
+    # core returns against the address script and only hash on a mismatch.
+    target_script_hex = script_for_address(address).hex()
+    txouts = fetch_txouts(args, rpc, listunspent)
+    for utxo, txout in zip(listunspent, txouts):
+        if not isinstance(txout, dict):
+            raise RuntimeError(f"missing core txout for {utxo['tx_hash']}:{utxo['tx_pos']}")
+        script_hex = txout.get("scriptPubKey", {}).get("hex")
+        if not script_hex:
+            raise RuntimeError(f"missing scriptPubKey for {utxo['tx_hash']}:{utxo['tx_pos']}")
+
+        if script_hex.lower() != target_script_hex:
+            digest = sha256(bytes.fromhex(script_hex)).digest()
+            raise RuntimeError(
+                f"scripthash mismatch for {utxo['tx_hash']}:{utxo['tx_pos']} "
+                f"{digest_to_scripthash(digest)} != {scripthash}"
+            )
+
+        core_value = satoshis(txout["value"])
+        if core_value != utxo["value"]:
+            raise RuntimeError(
+                f"value mismatch for {utxo['tx_hash']}:{utxo['tx_pos']} "
+                f"{core_value} != {utxo['value']}"
+            )
+        confirmed_from_utxos += utxo["value"]
+
+    if confirmed_from_utxos != balance["confirmed"]:
+        raise RuntimeError(
+            f"confirmed balance mismatch for {address}: "
+            f"{confirmed_from_utxos} != {balance['confirmed']}"
+        )
+
+    return {
+        "address": address,
+        "scripthash": scripthash,
+        "balance": balance,
+        "listunspent_count": len(listunspent),
+        "history_count": len(history),
+        "transaction_get_txid": txid,
+        "transaction_get_size": len(tx_raw) // 2,
+        "core_crosscheck_confirmed_sats": confirmed_from_utxos,
+    }
 
 
 def main():
-    parser = argparse.ArgumentParser(description="PEPEPOW Electrum protocol smoke checker")
+    parser = argparse.ArgumentParser(
+        description="PEPEPOW Electrum protocol smoke checker",
+        epilog=(
+            "Prints a single JSON object: the server_version, "
+            "headers_subscribe_height and broadcast_error shared by all checks, "
+            "and an 'addresses' list with one result per --address, in order."
+        ),
+    )
     parser.add_argument("--host", default="127.0.0.1")
     parser.add_argument("--port", type=int, default=50001)
-    parser.add_argument("--address", default="PGZrJkuJU39AqPfJQ2Rcpng9ChLwgybMHh")
+    parser.add_argument(
+        "--address",
+        action="append",
+        default=[],
+        help=f"Address to check. Can be repeated. Defaults to {DEFAULT_ADDRESS}.",
+    )
     parser.add_argument("--cli", default="/home/ubuntu/PEPEPOW-cli")
     parser.add_argument("--datadir", default="/home/ubuntu/.PEPEPOWcore")
+    parser.add_argument(
+        "--rpc-url",
+        default=None,
+        help=(
+            "PEPEPOWd JSON-RPC URL, http://[user:password@]host[:port]. "
+            "Defaults to rpcconnect/rpcport from PEPEPOW.conf."
+        ),
+    )
+    parser.add_argument("--rpc-user", default=None, help="Defaults to rpcuser from PEPEPOW.conf")
+    parser.add_argument(
+        "--rpc-password", default=None, help="Defaults to rpcpassword from PEPEPOW.conf"
+    )
+    parser.add_argument(
+        "--use-cli",
+        action="store_true",
+        help="Query core through PEPEPOW-cli instead of JSON-RPC.",
+    )
     args = parser.parse_args()
+    addresses = args.address or [DEFAULT_ADDRESS]
 
-    scripthash = address_to_scripthash(args.address)
-    cli = lambda *rpc_args: run_cli_json(args.cli, args.datadir, *rpc_args)
+    calls = [
+        ("server.version", ["pepepow-smoke", "1.4"]),
+        ("blockchain.headers.subscribe", []),
+    ]
+    for address in addresses:
+        scripthash = digest_to_scripthash(address_script_digest(address))
+        calls += [
+            ("blockchain.scripthash.get_balance", [scripthash]),
+            ("blockchain.scripthash.listunspent", [scripthash]),
+            ("blockchain.scripthash.get_history", [scripthash]),
+        ]
 
+    rpc = None
     client = ElectrumClient(args.host, args.port)
     try:
-        server_version = client.request("server.version", ["pepepow-smoke", "1.4"])["result"]
-        headers_sub = client.request("blockchain.headers.subscribe", [])["result"]
-        balance = client.request("blockchain.scripthash.get_balance", [scripthash])["result"]
-        listunspent = client.request("blockchain.scripthash.listunspent", [scripthash])["result"]
-        history = client.request("blockchain.scripthash.get_history", [scripthash])["result"]
-
-        if not listunspent and not history:
-            raise RuntimeError("expected at least one listunspent/history entry for smoke address")
-
-        txid = None
-        if history:
-            txid = history[0]["tx_hash"]
-        elif listunspent:
-            txid = listunspent[0]["tx_hash"]
-        else:
-            txid = "875791bbe84fa3fa3dce818296832837ee452b1f2986eb50e22142afebe2a1aa"
-
-        tx_raw = client.request("blockchain.transaction.get", [txid])["result"]
-        if not isinstance(tx_raw, str) or not tx_raw:
-            raise RuntimeError("blockchain.transaction.get returned invalid payload")
+        results = [resp["result"] for resp in client.request_many(calls)]
+        server_version, headers_sub = results[:2]
 
         tx_broadcast_err = client.request(
             "blockchain.transaction.broadcast",
@@ -107,49 +278,27 @@ def main():
             expect_error=True,
         )["error"]
 
-        confirmed_from_utxos = 0
-        for utxo in listunspent:
-            txout = cli("gettxout", utxo["tx_hash"], str(utxo["tx_pos"]), "true")
-            if not isinstance(txout, dict):
-                raise RuntimeError(f"missing core txout for {utxo['tx_hash']}:{utxo['tx_pos']}")
-            script_hex = txout.get("scriptPubKey", {}).get("hex")
-            if not script_hex:
-                raise RuntimeError(f"missing scriptPubKey for {utxo['tx_hash']}:{utxo['tx_pos']}")
-
-            expected_scripthash = sha256(bytes.fromhex(script_hex)).digest()[::-1].hex()
-            if expected_scripthash != scripthash:
-                raise RuntimeError(
-                    f"scripthash mismatch for {utxo['tx_hash']}:{utxo['tx_pos']} "
-                    f"{expected_scripthash} != {scripthash}"
-                )
-
-            core_value = satoshis(txout["value"])
-            if core_value != utxo["value"]:
-                raise RuntimeError(
-                    f"value mismatch for {utxo['tx_hash']}:{utxo['tx_pos']} "
-                    f"{core_value} != {utxo['value']}"
-                )
-            confirmed_from_utxos += utxo["value"]
-
-        if confirmed_from_utxos != balance["confirmed"]:
-            raise RuntimeError(
-                f"confirmed balance mismatch: {confirmed_from_utxos} != {balance['confirmed']}"
+        if not args.use_cli:
+            rpc = connect_core_rpc(
+                args.datadir, url=args.rpc_url, user=args.rpc_user, password=args.rpc_password
             )
 
+        address_results = []
+        for idx, address in enumerate(addresses):
+            balance, listunspent, history = results[2 + 3 * idx:5 + 3 * idx]
+            address_results.append(
+                check_address(client, args, rpc, address, balance, listunspent, history)
+            )
         output = {
             "server_version": server_version,
             "headers_subscribe_height": headers_sub.get("height"),
-            "scripthash": scripthash,
-            "balance": balance,
-            "listunspent_count": len(listunspent),
-            "history_count": len(history),
-            "transaction_get_txid": txid,
-            "transaction_get_size": len(tx_raw) // 2,
             "broadcast_error": tx_broadcast_err,
-            "core_crosscheck_confirmed_sats": confirmed_from_utxos,
+            "addresses": address_results,
         }
         print(json.dumps(output, indent=2, sort_keys=True))
     finally:
+        if rpc is not None:
+            rpc.close()
         client.close()
 
     return 0
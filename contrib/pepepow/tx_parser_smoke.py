@@ -40,11 +40,12 @@ def main():
     if args.txid:
         txs = [(f"custom_{idx+1}", txid) for idx, txid in enumerate(args.txid)]
 
+    deser = DeserializerPepepow(b"")
     for label, txid in txs:
         try:
             raw_hex = run_cli(args.cli, args.datadir, "getrawtransaction", txid, "0")
             raw_tx = bytes.fromhex(raw_hex)
-            deser = DeserializerPepepow(raw_tx)
+            deser.reset(raw_tx)
             tx = deser.read_tx()
             parsed_txid = hash_to_hex_str(tx.txid)
 
@@ -3,16 +3,22 @@
 import argparse
 import asyncio
 import json
+import mmap
+import multiprocessing
 import os
 import random
 import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
 from typing import Optional, Tuple
 
 from electrumx.lib.hash import hash_to_hex_str
 from electrumx.server.db import DB
 from electrumx.server.env import Env
 
+from _rpc import CoreRPC, connect_core_rpc
+
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -40,7 +46,41 @@ def parse_args():
         "--core-timeout",
         type=int,
         default=180,
-        help="Timeout in seconds for PEPEPOW-cli getblockhash.",
+        help="Timeout in seconds for core getblockhash lookups.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=8,
+        help="Number of concurrent PEPEPOW-cli getblockhash calls with --use-cli.",
+    )
+    parser.add_argument(
+        "--hash-jobs",
+        type=int,
+        default=1,
+        help=(
+            "Number of processes computing ElectrumX-side header hashes "
+            "(default 1; this usually shares the host with ElectrumX and PEPEPOWd)."
+        ),
+    )
+    parser.add_argument(
+        "--use-cli",
+        action="store_true",
+        help="Query core through PEPEPOW-cli instead of JSON-RPC.",
+    )
+    parser.add_argument(
+        "--core-rpc-url",
+        default=None,
+        help=(
+            "PEPEPOWd JSON-RPC URL, http://[user:password@]host[:port]. "
+            "Defaults to rpcconnect/rpcport from PEPEPOW.conf."
+        ),
+    )
+    parser.add_argument(
+        "--core-rpc-user", default=None, help="Defaults to rpcuser from PEPEPOW.conf"
+    )
+    parser.add_argument(
+        "--core-rpc-password", default=None, help="Defaults to rpcpassword from PEPEPOW.conf"
     )
     return parser.parse_args()
 
@@ -90,6 +130,56 @@ def configure_env(args):
     os.environ.setdefault("REPORT_SERVICES", "")
 
 
+class MappedLogicalFile:
+    """Read-only mmap view over the segment files of a util.LogicalFile.
+
+    Segments are mapped on first use, so repeated header reads are slices
+    of the page cache rather than an open/seek/read per height.
+    """
+
+    def __init__(self, logical_file):
+        self._filename_fmt = logical_file.filename_fmt
+        self._file_size = logical_file.file_size
+        self._maps = {}
+
+    def _segment(self, file_num: int, min_len: int) -> mmap.mmap:
+        mm = self._maps.get(file_num)
+        if mm is not None and len(mm) >= min_len:
+            return mm
+        if mm is not None:
+            # The server may have appended headers since the segment was mapped.
+            mm.close()
+            del self._maps[file_num]
+        with open(self._filename_fmt.format(file_num), "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, "MADV_RANDOM"):
+            mm.madvise(mmap.MADV_RANDOM)
+        self._maps[file_num] = mm
+        return mm
+
+    def read(self, start: int, size: int) -> bytes:
+        parts = []
+        while size > 0:
+            file_num, offset = divmod(start, self._file_size)
+            try:
+                mm = self._segment(file_num, min(offset + size, self._file_size))
+            except (FileNotFoundError, ValueError):
+                # ValueError: an empty segment cannot be mapped.
+                break
+            part = mm[offset:offset + size]
+            if not part:
+                break
+            parts.append(part)
+            start += len(part)
+            size -= len(part)
+        return b"".join(parts)
+
+    def close(self):
+        for mm in self._maps.values():
+            mm.close()
+        self._maps.clear()
+
+
 def core_hash(height: int, cli_path: str, datadir: str, timeout: int) -> str:
     cmd = [cli_path, f"-datadir={datadir}", "getblockhash", str(height)]
     return run_command(cmd, timeout=timeout)
@@ -107,7 +197,13 @@ async def _read_header_via_api(db: DB, height: int) -> bytes:
     return bytes(headers_concat)
 
 
-def read_header_bytes(db: DB, height: int, db_height: int) -> bytes:
+def read_header_bytes(
+    db: DB,
+    height: int,
+    db_height: int,
+    loop: asyncio.AbstractEventLoop,
+    headers_file: MappedLogicalFile,
+) -> bytes:
     if not (0 <= height <= db_height):
         raise ValueError(f"height out of range: {height}, expected [0, {db_height}]")
 
@@ -115,7 +211,7 @@ def read_header_bytes(db: DB, height: int, db_height: int) -> bytes:
     if hasattr(db, "read_headers"):
         db.db_height = db_height
         try:
-            header = asyncio.run(_read_header_via_api(db, height))
+            header = loop.run_until_complete(_read_header_via_api(db, height))
             expected_len = db.header_len(height)
             if len(header) != expected_len:
                 raise RuntimeError(
@@ -127,7 +223,7 @@ def read_header_bytes(db: DB, height: int, db_height: int) -> bytes:
 
     offset = db.header_offset(height)
     expected_len = db.header_len(height)
-    header = db.headers_file.read(offset, expected_len)
+    header = headers_file.read(offset, expected_len)
     if len(header) != expected_len:
         msg = (
             f"failed to read full header at height={height}: got {len(header)} bytes, "
@@ -140,11 +236,22 @@ def read_header_bytes(db: DB, height: int, db_height: int) -> bytes:
 
 
 def build_heights(db_height: int, samples: int, seed: int):
+    """Return sorted, de-duplicated heights to check.
+
+    Always includes genesis, the midpoint and the tip, plus one seeded pick
+    from each of ``samples`` equal-width strata of [0, db_height], so picks
+    are spread over the chain and never repeat a core lookup.  Ascending
+    order keeps header reads moving forward through the headers file.
+    """
     rng = random.Random(seed)
-    heights = [0, db_height // 2, db_height]
-    for _ in range(samples):
-        heights.append(rng.randint(0, db_height))
-    return heights
+    heights = {0, db_height // 2, db_height}
+    span = db_height + 1
+    samples = min(samples, span)
+    for k in range(samples):
+        low = k * span // samples
+        high = (k + 1) * span // samples - 1
+        heights.add(rng.randint(low, high))
+    return sorted(heights)
 
 
 def compare_hashes(
@@ -155,21 +262,68 @@ def compare_hashes(
     cli_path: str,
     datadir: str,
     core_timeout: int,
+    jobs: int = 8,
+    rpc: Optional[CoreRPC] = None,
+    hash_jobs: int = 1,
 ) -> Tuple[bool, Optional[Tuple[int, str, str]]]:
     mismatch = None
-    for height in heights:
-        header = read_header_bytes(db, height, db_height)
-        electrum_hash = hash_to_hex_str(coin.header_hash_for_height(header, height))
-        core_block_hash = core_hash(height, cli_path, datadir, core_timeout)
-
-        print(f"Height {height}", flush=True)
-        print(f"  ElectrumX: {electrum_hash}", flush=True)
-        print(f"  Core     : {core_block_hash}", flush=True)
-
-        if electrum_hash != core_block_hash:
-            print("  MISMATCH", flush=True)
-            mismatch = (height, electrum_hash, core_block_hash)
-            break
+    # One event loop for all DB header reads rather than one per height.
+    loop = asyncio.new_event_loop()
+    headers_file = MappedLogicalFile(db.headers_file)
+    try:
+        with ExitStack() as stack:
+            # Core lookups are independent per height: over JSON-RPC they go
+            # out as one batch, through PEPEPOW-cli they run concurrently.
+            if rpc is not None:
+                futures = []
+                core_hashes = rpc.batch([("getblockhash", [height]) for height in heights])
+            else:
+                executor = stack.enter_context(ThreadPoolExecutor(max_workers=max(1, jobs)))
+                futures = [
+                    executor.submit(core_hash, height, cli_path, datadir, core_timeout)
+                    for height in heights
+                ]
+                core_hashes = (future.result() for future in futures)
+
+            # PEPEPOW header hashes are CPU-bound (Xelis v2 is pure Python),
+            # so spread them over worker processes.
+            if hash_jobs > 1:
+                # Workers come from a fork server: forking this process would
+                # copy the open DB and the executor threads behind the loop.
+                hash_pool = stack.enter_context(ProcessPoolExecutor(
+                    max_workers=hash_jobs,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                ))
+                stack.callback(hash_pool.shutdown, cancel_futures=True)
+                hash_map = hash_pool.map
+            else:
+                hash_map = map
+            headers = [
+                read_header_bytes(db, height, db_height, loop, headers_file)
+                for height in heights
+            ]
+            electrum_hashes = hash_map(coin.header_hash_for_height, headers, heights)
+
+            # Results are consumed in height order so the first mismatch
+            # reported is the same as with a serial scan.
+            for height, electrum_raw, core_block_hash in zip(
+                heights, electrum_hashes, core_hashes
+            ):
+                electrum_hash = hash_to_hex_str(electrum_raw)
+
+                print(f"Height {height}", flush=True)
+                print(f"  ElectrumX: {electrum_hash}", flush=True)
+                print(f"  Core     : {core_block_hash}", flush=True)
+
+                if electrum_hash != core_block_hash:
+                    print("  MISMATCH", flush=True)
+                    mismatch = (height, electrum_hash, core_block_hash)
+                    for pending in futures:
+                        pending.cancel()
+                    break
+    finally:
+        headers_file.close()
+        loop.close()
 
     return mismatch is None, mismatch
 
@@ -180,6 +334,10 @@ def main():
         raise SystemExit("--samples must be >= 0")
     if args.db_height is not None and args.db_height < 0:
         raise SystemExit("--db-height must be >= 0")
+    if args.jobs < 1:
+        raise SystemExit("--jobs must be >= 1")
+    if args.hash_jobs < 1:
+        raise SystemExit("--hash-jobs must be >= 1")
 
     db_height = args.db_height
     if db_height is None:
@@ -192,17 +350,34 @@ def main():
     heights = build_heights(db_height, args.samples, args.seed)
 
     print(f"DB height: {db_height}", flush=True)
+    print(f"Requested samples: {args.samples}", flush=True)
     print(f"Tested heights: {heights}", flush=True)
 
-    all_match, mismatch = compare_hashes(
-        db=db,
-        coin=env.coin,
-        db_height=db_height,
-        heights=heights,
-        cli_path=args.cli,
-        datadir=args.datadir,
-        core_timeout=args.core_timeout,
-    )
+    rpc = None
+    if not args.use_cli:
+        rpc = connect_core_rpc(
+            args.datadir,
+            url=args.core_rpc_url,
+            user=args.core_rpc_user,
+            password=args.core_rpc_password,
+            timeout=args.core_timeout,
+        )
+    try:
+        all_match, mismatch = compare_hashes(
+            db=db,
+            coin=env.coin,
+            db_height=db_height,
+            heights=heights,
+            cli_path=args.cli,
+            datadir=args.datadir,
+            core_timeout=args.core_timeout,
+            jobs=args.jobs,
+            rpc=rpc,
+            hash_jobs=args.hash_jobs,
+        )
+    finally:
+        if rpc is not None:
+            rpc.close()
 
     if all_match:
         print("all_match=true", flush=True)
@@ -18,9 +18,14 @@ import hashlib
 import math
 import os
 import struct
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
+from electrumx.lib.util import struct_le_Q, unpack_le_uint32_from, unpack_le_uint64_from
+
 try:
     from blake3 import blake3
 except ImportError:  # pragma: no cover - optional dependency
@@ -34,7 +39,12 @@ _SPH_LIB_CANDIDATES = {
     'cubehash': ('libsph_cubehash.so',),
     'shavite': ('libsph_shavite.so',),
 }
+_MEMEHASH_SPH_CHAIN = ('blake', 'simd', 'echo', 'cubehash', 'shavite')
+_ZERO32 = bytes(32)
+_sha256 = hashlib.sha256
 _SPH_LIB_HANDLES: dict[str, ctypes.CDLL] = {}
+_SPH_FUNCS: dict[str, tuple] = {}
+_SPH_BUFFERS = threading.local()
 _SPH_CTX_SIZE = 1024
 _PEPEPOW_HOOHASH_LIB = 'libhoohash_pepepow.so'
 _PEPEPOW_HOOHASH_ENV = 'PEPEPOW_HOOHASH_LIB'
@@ -42,6 +52,7 @@ _HOOHASH_HASH_SIZE = 32
 _XELIS_V2_BIT = 0x8000
 _HOOHASH_V110_BIT = 0x4000
 _HOOHASH_LIB_HANDLE: Optional[ctypes.CDLL] = None
+_BYTES_LIKE = (bytes, bytearray, memoryview)
 
 
 def _load_sph_library(kind: str) -> ctypes.CDLL:
@@ -78,10 +89,10 @@ def _load_sph_library(kind: str) -> ctypes.CDLL:
     )
 
 
-def _run_sph_512(kind: str, data: bytes) -> bytes:
-    if not isinstance(data, (bytes, bytearray, memoryview)):
-        data = bytes(data)
-    data = bytes(data)
+def _sph_functions(kind: str) -> tuple:
+    funcs = _SPH_FUNCS.get(kind)
+    if funcs is not None:
+        return funcs
 
     lib = _load_sph_library(kind)
     init = getattr(lib, f'sph_{kind}512_init')
@@ -89,21 +100,42 @@ def _run_sph_512(kind: str, data: bytes) -> bytes:
     close = getattr(lib, f'sph_{kind}512_close')
 
     init.argtypes = [ctypes.c_void_p]
-    update.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_size_t]
+    update.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t]
     close.argtypes = [ctypes.c_void_p, ctypes.c_void_p]
     init.restype = None
     update.restype = None
     close.restype = None
 
-    ctx = ctypes.create_string_buffer(_SPH_CTX_SIZE)
-    in_buf = (ctypes.c_ubyte * len(data)).from_buffer_copy(data)
-    out_buf = (ctypes.c_ubyte * 64)()
+    funcs = _SPH_FUNCS[kind] = (init, update, close)
+    return funcs
 
-    init(ctypes.byref(ctx))
-    update(ctypes.byref(ctx), ctypes.byref(in_buf), len(data))
-    close(ctypes.byref(ctx), ctypes.byref(out_buf))
 
-    return bytes(out_buf)
+def _sph_buffers() -> tuple:
+    # One context and output buffer per thread, reused across calls.
+    buffers = getattr(_SPH_BUFFERS, 'buffers', None)
+    if buffers is None:
+        buffers = _SPH_BUFFERS.buffers = (
+            ctypes.create_string_buffer(_SPH_CTX_SIZE),
+            ctypes.create_string_buffer(64),
+        )
+    return buffers
+
+
+def _run_sph_chain_512(data: bytes) -> bytes:
+    # Each stage hashes the previous 64-byte digest straight out of the
+    # shared output buffer: update() has consumed it before close() writes.
+    if type(data) is not bytes:
+        data = bytes(data)
+
+    ctx, out_buf = _sph_buffers()
+    for kind in _MEMEHASH_SPH_CHAIN:
+        init, update, close = _sph_functions(kind)
+        init(ctx)
+        update(ctx, data, len(data))
+        close(ctx, out_buf)
+        data = out_buf
+
+    return out_buf.raw
 
 
 def _load_hoohash_library() -> ctypes.CDLL:
@@ -143,27 +175,42 @@ def _load_hoohash_library() -> ctypes.CDLL:
 
 def pepepow_memehash(header: bytes) -> bytes:
     '''PEPEPOW legacy PoW hash (pre-Xelis v2 path).'''
-    data = bytes(header)
-    if len(data) < 80:
+    if len(header) < 80:
         raise ValueError('PEPEPOW header must be at least 80 bytes')
 
-    hash1 = _run_sph_512('blake', data)
-    hash2 = _run_sph_512('simd', hash1)
-    hash3 = _run_sph_512('echo', hash2)
-    hash4 = _run_sph_512('cubehash', hash3)
-    hash5 = _run_sph_512('shavite', hash4)
+    hash5 = _run_sph_chain_512(header)
 
     # Match core's pepe_hash pipeline: each follow-up SHA256 step hashes a
     # uint512 buffer where the 32-byte digest is zero-padded to 64 bytes.
-    hash6 = hashlib.sha256(hash5).digest()
-    hash7 = hashlib.sha256(hash6 + bytes(32)).digest()
-    hash8 = hashlib.sha256(hash7 + bytes(32)).digest()
-    return hash8
+    sha256 = _sha256
+    hash6 = sha256(hash5).digest()
+    hash7 = sha256(hash6 + _ZERO32).digest()
+    return sha256(hash7 + _ZERO32).digest()
+
+
+def pepepow_memehash_batch(headers, max_workers: Optional[int] = None) -> list:
+    '''Return pepepow_memehash of each header, in order.
+
+    The headers are split into contiguous slices hashed on a thread pool;
+    the SPH calls release the GIL, so the slices run in parallel.
+    '''
+    headers = list(headers)
+    workers = min(max_workers or os.cpu_count() or 1, len(headers))
+    if workers <= 1:
+        return [pepepow_memehash(header) for header in headers]
+
+    def hash_slice(part):
+        return [pepepow_memehash(header) for header in part]
+
+    step = -(-len(headers) // workers)
+    parts = [headers[pos:pos + step] for pos in range(0, len(headers), step)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return [digest for hashes in executor.map(hash_slice, parts) for digest in hashes]
 
 
 def pepepow_hoohash_v110_hash(header: bytes) -> bytes:
     '''PEPEPOW Hoohash v110 path.'''
-    data = bytes(header)
+    data = header if isinstance(header, _BYTES_LIKE) else bytes(header)
     if len(data) != 80:
         raise ValueError('PEPEPOW Hoohash header must be exactly 80 bytes')
 
@@ -188,6 +235,7 @@ _XELIS_V2_HASH_SIZE = 32
 _XELIS_V2_NONCE_SIZE = 12
 _XELIS_V2_SCRATCHPAD_ITERS = 3
 _XELIS_V2_AES_KEY = b'xelishash-pow-v2'
+_XELIS_SCRATCH = threading.local()
 _CHACHA_CONST_STATE = (1634760805, 857760878, 2036477234, 1797285236)
 _MASK_64 = (1 << 64) - 1
 
@@ -219,154 +267,113 @@ def _require_blake3() -> None:
         )
 
 
-def _uint64(value: int) -> int:
-    return value & _MASK_64
-
-
-def _rotl64(value: int, shift: int) -> int:
-    shift &= 63
-    value &= _MASK_64
-    if shift == 0:
-        return value
-    return ((value << shift) & _MASK_64) | (value >> (64 - shift))
-
+def _write_uint64_le(buf: bytearray, offset: int, value: int) -> None:
+    struct_le_Q.pack_into(buf, offset, value & _MASK_64)
 
-def _rotr64(value: int, shift: int) -> int:
-    shift &= 63
-    value &= _MASK_64
-    if shift == 0:
-        return value
-    return (value >> shift) | ((value << (64 - shift)) & _MASK_64)
 
+def _read_uint64_le(buf: bytearray, offset: int = 0) -> int:
+    return unpack_le_uint64_from(buf, offset)[0]
 
-def _combine_uint64(high: int, low: int) -> int:
-    return ((high & _MASK_64) << 64) | (low & _MASK_64)
 
+def _build_aes_round_tables() -> tuple:
+    # T-tables for one AES encryption round on little-endian column words:
+    # Te_n[x] is S[x] multiplied by row n of the MixColumns matrix, so a
+    # round column is four lookups XORed together with the round key word.
+    te0, te1, te2, te3 = (array('I', bytes(1024)) for _ in range(4))
+    for x in range(256):
+        s1 = _AES_SBOX[x]
+        s2 = ((s1 << 1) ^ 0x1B) & 0xFF if s1 & 0x80 else s1 << 1
+        s3 = s2 ^ s1
+        te0[x] = s2 | (s1 << 8) | (s1 << 16) | (s3 << 24)
+        te1[x] = s3 | (s2 << 8) | (s1 << 16) | (s1 << 24)
+        te2[x] = s1 | (s3 << 8) | (s2 << 16) | (s1 << 24)
+        te3[x] = s1 | (s1 << 8) | (s3 << 16) | (s2 << 24)
+    return te0, te1, te2, te3
 
-def _write_uint64_le(buf: bytearray, offset: int, value: int) -> None:
-    buf[offset:offset + 8] = _uint64(value).to_bytes(8, 'little')
 
-
-def _read_uint64_le(buf: bytearray, offset: int = 0) -> int:
-    return int.from_bytes(buf[offset:offset + 8], 'little')
-
-
-def _xtime(x: int) -> int:
-    return ((x << 1) ^ 0x1B) & 0xFF if x & 0x80 else (x << 1) & 0xFF
-
-
-def _gmul(a: int, b: int) -> int:
-    result = 0
-    while b:
-        if b & 1:
-            result ^= a
-        a = _xtime(a)
-        b >>= 1
-    return result
-
-
-def _sub_bytes(state: bytearray) -> None:
-    for i in range(16):
-        state[i] = _AES_SBOX[state[i]]
-
-
-def _shift_rows(state: bytearray) -> None:
-    tmp = state[:]
-    state[1] = tmp[5]
-    state[2] = tmp[10]
-    state[3] = tmp[15]
-    state[5] = tmp[9]
-    state[6] = tmp[14]
-    state[7] = tmp[3]
-    state[9] = tmp[13]
-    state[10] = tmp[2]
-    state[11] = tmp[7]
-    state[13] = tmp[1]
-    state[14] = tmp[6]
-    state[15] = tmp[11]
-
-
-def _mix_columns(state: bytearray) -> None:
-    tmp = state[:]
-    for i in range(4):
-        base = i * 4
-        state[base + 0] = (
-            _gmul(0x02, tmp[base + 0]) ^
-            _gmul(0x03, tmp[base + 1]) ^
-            tmp[base + 2] ^
-            tmp[base + 3]
-        )
-        state[base + 1] = (
-            tmp[base + 0] ^
-            _gmul(0x02, tmp[base + 1]) ^
-            _gmul(0x03, tmp[base + 2]) ^
-            tmp[base + 3]
-        )
-        state[base + 2] = (
-            tmp[base + 0] ^
-            tmp[base + 1] ^
-            _gmul(0x02, tmp[base + 2]) ^
-            _gmul(0x03, tmp[base + 3])
-        )
-        state[base + 3] = (
-            _gmul(0x03, tmp[base + 0]) ^
-            tmp[base + 1] ^
-            tmp[base + 2] ^
-            _gmul(0x02, tmp[base + 3])
-        )
+_AES_TE0, _AES_TE1, _AES_TE2, _AES_TE3 = _build_aes_round_tables()
+_AES_BLOCK_WORDS = struct.Struct('<4I')
 
 
-def _add_round_key(state: bytearray, round_key: bytes) -> None:
-    for i in range(16):
-        state[i] ^= round_key[i]
+def _aes_single_round(block: bytearray, key: bytes) -> None:
+    # SubBytes, ShiftRows, MixColumns and AddRoundKey in one pass.
+    te0, te1, te2, te3 = _AES_TE0, _AES_TE1, _AES_TE2, _AES_TE3
+    k0, k1, k2, k3 = _AES_BLOCK_WORDS.unpack(key)
+    (b0, b1, b2, b3, b4, b5, b6, b7,
+     b8, b9, b10, b11, b12, b13, b14, b15) = block
+    _AES_BLOCK_WORDS.pack_into(
+        block, 0,
+        te0[b0] ^ te1[b5] ^ te2[b10] ^ te3[b15] ^ k0,
+        te0[b4] ^ te1[b9] ^ te2[b14] ^ te3[b3] ^ k1,
+        te0[b8] ^ te1[b13] ^ te2[b2] ^ te3[b7] ^ k2,
+        te0[b12] ^ te1[b1] ^ te2[b6] ^ te3[b11] ^ k3,
+    )
 
 
-def _aes_single_round(block: bytearray, key: bytes) -> None:
-    _sub_bytes(block)
-    _shift_rows(block)
-    _mix_columns(block)
-    _add_round_key(block, key)
-
-
-def _quarter_round(state, a, b, c, d):
-    state[a] = (state[a] + state[b]) & 0xFFFFFFFF
-    state[d] ^= state[a]
-    state[d] = ((state[d] << 16) | (state[d] >> 16)) & 0xFFFFFFFF
-
-    state[c] = (state[c] + state[d]) & 0xFFFFFFFF
-    state[b] ^= state[c]
-    state[b] = ((state[b] << 12) | (state[b] >> 20)) & 0xFFFFFFFF
-
-    state[a] = (state[a] + state[b]) & 0xFFFFFFFF
-    state[d] ^= state[a]
-    state[d] = ((state[d] << 8) | (state[d] >> 24)) & 0xFFFFFFFF
-
-    state[c] = (state[c] + state[d]) & 0xFFFFFFFF
-    state[b] ^= state[c]
-    state[b] = ((state[b] << 7) | (state[b] >> 25)) & 0xFFFFFFFF
-
-
-def _chacha20_block(key_words, counter, nonce_words, rounds):
-    state = [
-        _CHACHA_CONST_STATE[0], _CHACHA_CONST_STATE[1],
-        _CHACHA_CONST_STATE[2], _CHACHA_CONST_STATE[3],
-        *key_words,
-        counter,
-        *nonce_words,
-    ]
-    working = state[:]
+# ChaCha rows are held as four 32-bit lanes spaced 64 bits apart in one int,
+# so the four quarter rounds of a column or diagonal round run together and
+# carries out of a lane land in its spare high bits, cleared by the mask.
+_CHACHA_LANES = 0xFFFFFFFF_0000_0000_FFFFFFFF_0000_0000_FFFFFFFF_0000_0000_FFFFFFFF
+_CHACHA_LANE_LOW1 = (1 << 64) - 1
+_CHACHA_LANE_LOW2 = (1 << 128) - 1
+_CHACHA_LANE_LOW3 = (1 << 192) - 1
+_pack_chacha_block = struct.Struct('<16I').pack
+_unpack_chacha_key = struct.Struct('<8I').unpack
+_unpack_chacha_nonce_from = struct.Struct('<3I').unpack_from
+_CHACHA_ROW0 = sum(word << (64 * lane) for lane, word in enumerate(_CHACHA_CONST_STATE))
+
+
+def _chacha20_block(b0: int, c0: int, d0: int, rounds: int) -> bytes:
+    # b0, c0 and d0 are the key and counter/nonce rows in lane form.
+    lanes = _CHACHA_LANES
+    low1, low2, low3 = _CHACHA_LANE_LOW1, _CHACHA_LANE_LOW2, _CHACHA_LANE_LOW3
+    a0 = _CHACHA_ROW0
+    a, b, c, d = a0, b0, c0, d0
     for _ in range(rounds // 2):
-        _quarter_round(working, 0, 4, 8, 12)
-        _quarter_round(working, 1, 5, 9, 13)
-        _quarter_round(working, 2, 6, 10, 14)
-        _quarter_round(working, 3, 7, 11, 15)
-        _quarter_round(working, 0, 5, 10, 15)
-        _quarter_round(working, 1, 6, 11, 12)
-        _quarter_round(working, 2, 7, 8, 13)
-        _quarter_round(working, 3, 4, 9, 14)
-    for i in range(16):
-        working[i] = (working[i] + state[i]) & 0xFFFFFFFF
-    return working
+        # Column round.
+        a = (a + b) & lanes
+        d ^= a
+        d = ((d << 16) | (d >> 16)) & lanes
+        c = (c + d) & lanes
+        b ^= c
+        b = ((b << 12) | (b >> 20)) & lanes
+        a = (a + b) & lanes
+        d ^= a
+        d = ((d << 8) | (d >> 24)) & lanes
+        c = (c + d) & lanes
+        b ^= c
+        b = ((b << 7) | (b >> 25)) & lanes
+        # Rotate rows b, c, d left by 1, 2, 3 lanes to line up the diagonals.
+        b = (b >> 64) | ((b & low1) << 192)
+        c = (c >> 128) | ((c & low2) << 128)
+        d = (d >> 192) | ((d & low3) << 64)
+        # Diagonal round.
+        a = (a + b) & lanes
+        d ^= a
+        d = ((d << 16) | (d >> 16)) & lanes
+        c = (c + d) & lanes
+        b ^= c
+        b = ((b << 12) | (b >> 20)) & lanes
+        a = (a + b) & lanes
+        d ^= a
+        d = ((d << 8) | (d >> 24)) & lanes
+        c = (c + d) & lanes
+        b ^= c
+        b = ((b << 7) | (b >> 25)) & lanes
+        b = (b >> 192) | ((b & low3) << 64)
+        c = (c >> 128) | ((c & low2) << 128)
+        d = (d >> 64) | ((d & low1) << 192)
+
+    a = (a + a0) & lanes
+    b = (b + b0) & lanes
+    c = (c + c0) & lanes
+    d = (d + d0) & lanes
+    return _pack_chacha_block(
+        a & 0xFFFFFFFF, (a >> 64) & 0xFFFFFFFF, (a >> 128) & 0xFFFFFFFF, a >> 192,
+        b & 0xFFFFFFFF, (b >> 64) & 0xFFFFFFFF, (b >> 128) & 0xFFFFFFFF, b >> 192,
+        c & 0xFFFFFFFF, (c >> 64) & 0xFFFFFFFF, (c >> 128) & 0xFFFFFFFF, c >> 192,
+        d & 0xFFFFFFFF, (d >> 64) & 0xFFFFFFFF, (d >> 128) & 0xFFFFFFFF, d >> 192,
+    )
 
 
 def _chacha20_encrypt_bytes(
@@ -380,199 +387,174 @@ def _chacha20_encrypt_bytes(
         raise ValueError('ChaCha20 key must be 32 bytes')
     if rounds % 2:
         raise ValueError('ChaCha20 rounds must be even')
-
-    nonce_bytes = bytes((nonce or b'\x00' * _XELIS_V2_NONCE_SIZE)[:_XELIS_V2_NONCE_SIZE])
-    nonce_words = list(struct.unpack('<3I', nonce_bytes.ljust(_XELIS_V2_NONCE_SIZE, b'\x00')))
-    key_words = list(struct.unpack('<8I', key))
-
-    counter = 0
-    out = bytearray(length)
-    in_view = memoryview(in_data) if in_data is not None else None
-    produced = 0
-    while produced < length:
-        block_words = _chacha20_block(key_words, counter, nonce_words, rounds)
-        block = b''.join(struct.pack('<I', word) for word in block_words)
-        take = min(64, length - produced)
-        if in_view is None:
-            out[produced:produced + take] = block[:take]
-        else:
-            for idx in range(take):
-                out[produced + idx] = in_view[produced + idx] ^ block[idx]
-        produced += take
-        counter = (counter + 1) & 0xFFFFFFFF
-
-    return bytes(out)
-
-
-def _blake3_digest(data: bytes) -> bytes:
+    if in_data is not None and len(in_data) < length:
+        raise ValueError('ChaCha20 input is shorter than the requested length')
+
+    if nonce is not None and len(nonce) >= _XELIS_V2_NONCE_SIZE:
+        # Read the nonce in place; any bytes past the first twelve are ignored.
+        n0, n1, n2 = _unpack_chacha_nonce_from(nonce)
+    else:
+        n0, n1, n2 = _unpack_chacha_nonce_from(
+            bytes(nonce or b'').ljust(_XELIS_V2_NONCE_SIZE, b'\x00')
+        )
+    k0, k1, k2, k3, k4, k5, k6, k7 = _unpack_chacha_key(key)
+
+    # Only the counter lane of row d changes from block to block.
+    b0 = k0 | (k1 << 64) | (k2 << 128) | (k3 << 192)
+    c0 = k4 | (k5 << 64) | (k6 << 128) | (k7 << 192)
+    nonce_row = (n0 << 64) | (n1 << 128) | (n2 << 192)
+    stream = b''.join([
+        _chacha20_block(b0, c0, nonce_row | counter, rounds)
+        for counter in range((length + 63) // 64)
+    ])[:length]
+
+    if in_data is not None:
+        # XOR the whole input against the keystream as one big integer.
+        stream = (
+            int.from_bytes(stream, 'little') ^ int.from_bytes(in_data[:length], 'little')
+        ).to_bytes(length, 'little')
+    return stream
+
+
+def _blake3_digest_parallel(data: bytes) -> bytes:
+    # Only worth it for large inputs such as the scratch pad; blake3 splits
+    # the work across threads in 1 KiB chunks.
     _require_blake3()
-    return blake3(data).digest(length=_XELIS_V2_HASH_SIZE)
+    return blake3(data, max_threads=blake3.AUTO).digest(length=_XELIS_V2_HASH_SIZE)
 
 
 def _xelis_stage1(input_bytes: bytes, scratch: bytearray) -> None:
-    key = bytearray(_XELIS_V2_CHUNK_SIZE * _XELIS_V2_CHUNKS)
+    _require_blake3()
+    hasher = blake3
+    chunk_size = _XELIS_V2_CHUNK_SIZE
+    key = memoryview(bytearray(chunk_size * _XELIS_V2_CHUNKS))
     key[:len(input_bytes)] = input_bytes
-    buffer = bytearray(_XELIS_V2_CHUNK_SIZE * 2)
-    buffer[:_XELIS_V2_CHUNK_SIZE] = _blake3_digest(input_bytes)
+    buffer = bytearray(chunk_size * 2)
+    buffer[:chunk_size] = hasher(input_bytes).digest(length=_XELIS_V2_HASH_SIZE)
 
     chunk_len = _XELIS_V2_OUTPUT_SIZE // _XELIS_V2_CHUNKS
+    scratch_view = memoryview(scratch)
     offset = 0
     for chunk in range(_XELIS_V2_CHUNKS):
-        start = chunk * _XELIS_V2_CHUNK_SIZE
-        buffer[_XELIS_V2_CHUNK_SIZE:] = key[start:start + _XELIS_V2_CHUNK_SIZE]
-        input_hash = _blake3_digest(buffer)
+        start = chunk * chunk_size
+        buffer[chunk_size:] = key[start:start + chunk_size]
+        input_hash = hasher(buffer).digest(length=_XELIS_V2_HASH_SIZE)
         if chunk == 0:
-            nonce = buffer[:_XELIS_V2_NONCE_SIZE]
+            # The nonce is the first twelve bytes of the buffer.
+            nonce = buffer
         else:
-            nonce = scratch[offset - _XELIS_V2_NONCE_SIZE:offset]
+            nonce = scratch_view[offset - _XELIS_V2_NONCE_SIZE:offset]
         stream = _chacha20_encrypt_bytes(input_hash, nonce, chunk_len, rounds=8)
         scratch[offset:offset + chunk_len] = stream
         offset += chunk_len
-        buffer[:_XELIS_V2_CHUNK_SIZE] = input_hash
-
-
-def _udiv(high: int, low: int, divisor: int) -> int:
-    if divisor == 0:
-        return 0
-    dividend = _combine_uint64(high, low)
-    return (dividend // divisor) & _MASK_64
-
-
-def _operation_case_0(a, b, c, r, result, i, j):
-    return _uint64(_rotl64(c, i * j) ^ b)
-
-
-def _operation_case_1(a, b, c, r, result, i, j):
-    return _uint64(_rotr64(c, i * j) ^ a)
-
-
-def _operation_case_2(a, b, c, *_):
-    return _uint64(a ^ b ^ c)
-
-
-def _operation_case_3(a, b, c, *_):
-    return _uint64((a + b) * c)
-
-
-def _operation_case_4(a, b, c, *_):
-    return _uint64((b - c) * a)
-
-
-def _operation_case_5(a, b, c, *_):
-    return _uint64(c - a + b)
-
-
-def _operation_case_6(a, b, c, *_):
-    return _uint64(a - b + c)
-
-
-def _operation_case_7(a, b, c, *_):
-    return _uint64(b * c + a)
-
-
-def _operation_case_8(a, b, c, *_):
-    return _uint64(c * a + b)
-
-
-def _operation_case_9(a, b, c, *_):
-    return _uint64(a * b * c)
-
-
-def _operation_case_10(a, b, c, *_):
-    return _uint64(_combine_uint64(a, b) % ((c | 1) & _MASK_64))
-
-
-def _operation_case_11(a, b, c, r, result, *_):
-    t2 = _combine_uint64(_rotl64(result, r), a | 2)
-    combined = _combine_uint64(b, c)
-    return _uint64(c if t2 > combined else combined % t2)
-
-
-def _operation_case_12(a, b, c, *_):
-    return _udiv(c, a, (b | 4) & _MASK_64)
-
-
-def _operation_case_13(a, b, c, r, result, *_):
-    t1 = _combine_uint64(_rotl64(result, r), b)
-    t2 = _combine_uint64(a, c | 8)
-    if t1 > t2 and t2 != 0:
-        return _uint64(t1 // t2)
-    return _uint64(a ^ b)
-
-
-def _operation_case_14(a, b, c, *_):
-    return _uint64((_combine_uint64(b, a) * c) >> 64)
-
-
-def _operation_case_15(a, b, c, r, result, *_):
-    left = _combine_uint64(a, c)
-    right = _combine_uint64(_rotr64(result, r), b)
-    return _uint64((left * right) >> 64)
-
-
-_XELIS_OPERATIONS = [
-    _operation_case_0,
-    _operation_case_1,
-    _operation_case_2,
-    _operation_case_3,
-    _operation_case_4,
-    _operation_case_5,
-    _operation_case_6,
-    _operation_case_7,
-    _operation_case_8,
-    _operation_case_9,
-    _operation_case_10,
-    _operation_case_11,
-    _operation_case_12,
-    _operation_case_13,
-    _operation_case_14,
-    _operation_case_15,
-]
+        buffer[:chunk_size] = input_hash
 
 
 def _xelis_stage3(scratch: bytearray) -> None:
+    # Module constants are bound to locals and 64-bit masking and 128-bit
+    # combining are written out, to keep global lookups and calls out of
+    # the inner loop.
+    mask = _MASK_64
+    buf_size = _XELIS_V2_BUFFER_SIZE
+    mem_size = _XELIS_V2_MEMORY_SIZE
+    isqrt = math.isqrt
+
     qwords = memoryview(scratch).cast('Q')
-    mem_a = qwords[:_XELIS_V2_BUFFER_SIZE]
-    mem_b = qwords[_XELIS_V2_BUFFER_SIZE:]
+    mem_a = qwords[:buf_size]
+    mem_b = qwords[buf_size:]
 
-    addr_a = mem_b[_XELIS_V2_BUFFER_SIZE - 1]
-    addr_b = mem_a[_XELIS_V2_BUFFER_SIZE - 1] >> 32
+    addr_a = mem_b[buf_size - 1]
+    addr_b = mem_a[buf_size - 1] >> 32
     r = 0
     block = bytearray(16)
 
     for i in range(_XELIS_V2_SCRATCHPAD_ITERS):
-        mem_a_val = mem_a[addr_a % _XELIS_V2_BUFFER_SIZE]
-        mem_b_val = mem_b[addr_b % _XELIS_V2_BUFFER_SIZE]
+        mem_a_val = mem_a[addr_a % buf_size]
+        mem_b_val = mem_b[addr_b % buf_size]
 
         _write_uint64_le(block, 0, mem_b_val)
         _write_uint64_le(block, 8, mem_a_val)
         _aes_single_round(block, _XELIS_V2_AES_KEY)
         hash1 = _read_uint64_le(block, 0)
         hash2 = mem_a_val ^ mem_b_val
-        addr_a = _uint64(~(hash1 ^ hash2))
-
-        for j in range(_XELIS_V2_BUFFER_SIZE):
-            idx_a = addr_a % _XELIS_V2_BUFFER_SIZE
-            a = mem_a[idx_a]
-            idx_b = _uint64(~_rotr64(addr_a, r)) % _XELIS_V2_BUFFER_SIZE
-            b = mem_b[idx_b]
-            c = mem_a[r] if r < _XELIS_V2_BUFFER_SIZE else mem_b[r - _XELIS_V2_BUFFER_SIZE]
-            r = (r + 1) % _XELIS_V2_MEMORY_SIZE
-            op_index = _rotl64(addr_a, c & 0xFFFFFFFF) & 0xF
-            v = _XELIS_OPERATIONS[op_index](a, b, c, r, addr_a, i, j)
-            addr_a = _uint64(_rotl64(addr_a ^ v, 1))
-
-            target = _XELIS_V2_BUFFER_SIZE - j - 1
-            t = _uint64(mem_a[target] ^ addr_a)
+        addr_a = ~(hash1 ^ hash2) & mask
+
+        for j in range(buf_size):
+            a = mem_a[addr_a % buf_size]
+            # Rotations are written out inline: rotl by s is
+            # ((x << s) | (x >> (64 - s))) & mask for 0 <= s < 64.
+            s = r & 63
+            b = mem_b[(~((addr_a >> s) | (addr_a << (64 - s))) & mask) % buf_size]
+            # mem_a and mem_b are the two halves of qwords, so r indexes it
+            # directly.
+            c = qwords[r]
+            r += 1
+            if r == mem_size:
+                r = 0
+            s = c & 63
+            op_index = ((addr_a << s) | (addr_a >> (64 - s))) & 0xF
+            # The sixteen Xelis v2 operations, split in halves so that any
+            # case is reached in four comparisons.
+            if op_index < 8:
+                if op_index < 4:
+                    if op_index == 0:
+                        s = (i * j) & 63
+                        v = (((c << s) | (c >> (64 - s))) & mask) ^ b
+                    elif op_index == 1:
+                        s = (i * j) & 63
+                        v = (((c >> s) | (c << (64 - s))) & mask) ^ a
+                    elif op_index == 2:
+                        v = a ^ b ^ c
+                    else:
+                        v = ((a + b) * c) & mask
+                elif op_index == 4:
+                    v = ((b - c) * a) & mask
+                elif op_index == 5:
+                    v = (c - a + b) & mask
+                elif op_index == 6:
+                    v = (a - b + c) & mask
+                else:
+                    v = (b * c + a) & mask
+            elif op_index < 12:
+                if op_index == 8:
+                    v = (c * a + b) & mask
+                elif op_index == 9:
+                    v = (a * b * c) & mask
+                elif op_index == 10:
+                    v = ((a << 64) | b) % (c | 1)
+                else:
+                    s = r & 63
+                    t2 = ((((addr_a << s) | (addr_a >> (64 - s))) & mask) << 64) | a | 2
+                    combined = (b << 64) | c
+                    v = c if t2 > combined else (combined % t2) & mask
+            elif op_index == 12:
+                v = (((c << 64) | a) // (b | 4)) & mask
+            elif op_index == 13:
+                s = r & 63
+                t1 = ((((addr_a << s) | (addr_a >> (64 - s))) & mask) << 64) | b
+                t2 = (a << 64) | c | 8
+                v = (t1 // t2) & mask if t1 > t2 else a ^ b
+            elif op_index == 14:
+                v = ((((b << 64) | a) * c) >> 64) & mask
+            else:
+                s = r & 63
+                right = ((((addr_a >> s) | (addr_a << (64 - s))) & mask) << 64) | b
+                v = ((((a << 64) | c) * right) >> 64) & mask
+            x = addr_a ^ v
+            addr_a = ((x << 1) | (x >> 63)) & mask
+
+            target = buf_size - j - 1
+            t = mem_a[target] ^ addr_a
             mem_a[target] = t
-            mem_b[j] = _uint64(mem_b[j] ^ _rotr64(t, addr_a & 0xFFFFFFFF))
+            s = addr_a & 63
+            mem_b[j] ^= ((t >> s) | (t << (64 - s))) & mask
 
-        addr_b = math.isqrt(addr_a)
+        addr_b = isqrt(addr_a)
 
 
 def pepepow_xelisv2_hash(header: bytes) -> bytes:
     '''PEPEPOW Xelis v2 hash path.'''
-    data = header if isinstance(header, (bytes, bytearray)) else bytes(header)
+    data = header if isinstance(header, _BYTES_LIKE) else bytes(header)
     if len(data) < 80:
         raise ValueError('PEPEPOW header must be at least 80 bytes')
 
@@ -580,10 +562,14 @@ def pepepow_xelisv2_hash(header: bytes) -> bytes:
     length = min(len(data), _XELIS_V2_INPUT_LEN)
     prepared[:length] = data[:length]
 
-    scratch = bytearray(_XELIS_V2_OUTPUT_SIZE)
+    # Stage 1 overwrites every byte of the scratch pad, so a buffer kept
+    # per thread can be reused without clearing it first.
+    scratch = getattr(_XELIS_SCRATCH, 'scratch', None)
+    if scratch is None:
+        scratch = _XELIS_SCRATCH.scratch = bytearray(_XELIS_V2_OUTPUT_SIZE)
     _xelis_stage1(prepared, scratch)
     _xelis_stage3(scratch)
-    return _blake3_digest(scratch)
+    return _blake3_digest_parallel(scratch)
 
 
 def pepepow_header_hash(header: bytes) -> bytes:
@@ -591,13 +577,14 @@ def pepepow_header_hash(header: bytes) -> bytes:
 
     PePe-core uses the Xelis v2 path when nVersion has bit 0x8000 set.
     '''
-    data = bytes(header)
-    if len(data) < 80:
+    if not isinstance(header, _BYTES_LIKE):
+        header = bytes(header)
+    if len(header) < 80:
         raise ValueError('PEPEPOW header must be at least 80 bytes')
 
-    version = int.from_bytes(data[:4], 'little', signed=False)
+    version, = unpack_le_uint32_from(header)
     if version & _HOOHASH_V110_BIT:
-        return pepepow_hoohash_v110_hash(data)
+        return pepepow_hoohash_v110_hash(header)
     if version & _XELIS_V2_BIT:
-        return pepepow_xelisv2_hash(data)
-    return pepepow_memehash(data)
+        return pepepow_xelisv2_hash(header)
+    return pepepow_memehash(header)
@@ -7,14 +7,28 @@
 from dataclasses import dataclass
 from typing import Any
 
-from electrumx.lib.tx import Deserializer, Tx
+from electrumx.lib.tx import Deserializer, Tx, TxInput, TxOutput
 from electrumx.lib.tx_dash import DeserializerDash
 from electrumx.lib.util import (
     pack_le_int32, pack_le_uint16, pack_le_uint32,
     pack_varbytes, pack_varint,
+    unpack_le_int64_from, unpack_le_uint16_from,
+    unpack_le_uint32_from, unpack_le_uint64_from,
 )
 
 
+def _read_varint_from(binary, cursor):
+    '''Return a (value, cursor) pair for the varint at cursor.'''
+    n = binary[cursor]
+    if n < 253:
+        return n, cursor + 1
+    if n == 253:
+        return unpack_le_uint16_from(binary, cursor + 1)[0], cursor + 3
+    if n == 254:
+        return unpack_le_uint32_from(binary, cursor + 1)[0], cursor + 5
+    return unpack_le_uint64_from(binary, cursor + 1)[0], cursor + 9
+
+
 @dataclass(kw_only=True, slots=True)
 class PepepowTx(Tx):
     '''Class representing a PEPEPOW transaction.'''
@@ -25,11 +39,11 @@ class PepepowTx(Tx):
         n_locktime = pack_le_uint32(self.locktime)
         txins = (
             pack_varint(len(self.inputs))
-            + b''.join(tx_in.serialize() for tx_in in self.inputs)
+            + b''.join([tx_in.serialize() for tx_in in self.inputs])
         )
         txouts = (
             pack_varint(len(self.outputs))
-            + b''.join(tx_out.serialize() for tx_out in self.outputs)
+            + b''.join([tx_out.serialize() for tx_out in self.outputs])
         )
         if self.tx_type:
             header = pack_le_uint16(self.version) + pack_le_uint16(self.tx_type)
@@ -56,6 +70,21 @@ class DeserializerPepepow(Deserializer):
     SPEC_TX_HANDLERS = DeserializerDash.SPEC_TX_HANDLERS
     CB_TX = DeserializerDash.CB_TX
 
+    def __init__(self, binary, start=0):
+        super().__init__(binary, start)
+        # Hash txids straight out of the buffer instead of copying each tx
+        # span first; when reading a whole block this saves a copy per tx.
+        self._binary_view = memoryview(binary)
+
+    def reset(self, binary, start=0):
+        '''Point the deserializer at a new buffer so one instance can be
+        reused across transactions.'''
+        assert isinstance(binary, bytes)
+        self.binary = binary
+        self._binary_length = len(binary)
+        self._binary_view = memoryview(binary)
+        self.cursor = start
+
     def _read_extra_payload(self, tx_type: int, payload_size: int):
         payload_start = self.cursor
         remaining = self._binary_length - payload_start
@@ -78,6 +107,63 @@ class DeserializerPepepow(Deserializer):
 
         return self._read_nbytes(payload_size)
 
+    # _read_inputs and _read_outputs inline the per-field reads of the base
+    # class; they run for every input and output during sync, so keep the
+    # cursor in a local and avoid a method dispatch per field.
+
+    def _read_inputs(self):
+        binary = self.binary
+        binary_length = self._binary_length
+        unpack_uint32 = unpack_le_uint32_from
+        count, cursor = _read_varint_from(binary, self.cursor)
+        inputs = []
+        append = inputs.append
+        for _ in range(count):
+            prev_hash = binary[cursor:cursor + 32]
+            prev_idx, = unpack_uint32(binary, cursor + 32)
+            cursor += 36
+            # Script lengths almost always fit the single-byte varint form.
+            script_len = binary[cursor]
+            if script_len < 253:
+                cursor += 1
+            else:
+                script_len, cursor = _read_varint_from(binary, cursor)
+            end = cursor + script_len
+            assert binary_length >= end
+            script = binary[cursor:end]
+            sequence, = unpack_uint32(binary, end)
+            cursor = end + 4
+            append(TxInput(
+                prev_hash=prev_hash,
+                prev_idx=prev_idx,
+                script=script,
+                sequence=sequence,
+            ))
+        self.cursor = cursor
+        return inputs
+
+    def _read_outputs(self):
+        binary = self.binary
+        binary_length = self._binary_length
+        unpack_int64 = unpack_le_int64_from
+        count, cursor = _read_varint_from(binary, self.cursor)
+        outputs = []
+        append = outputs.append
+        for _ in range(count):
+            value, = unpack_int64(binary, cursor)
+            cursor += 8
+            script_len = binary[cursor]
+            if script_len < 253:
+                cursor += 1
+            else:
+                script_len, cursor = _read_varint_from(binary, cursor)
+            end = cursor + script_len
+            assert binary_length >= end
+            append(TxOutput(value=value, pk_script=binary[cursor:end]))
+            cursor = end
+        self.cursor = cursor
+        return outputs
+
     def read_tx(self):
         start = self.cursor
         header = self._read_le_uint32()
@@ -102,7 +188,7 @@ class DeserializerPepepow(Deserializer):
         else:
             extra_payload = b''
 
-        txid = self.TX_HASH_FN(self.binary[start:self.cursor])
+        txid = self.TX_HASH_FN(self._binary_view[start:self.cursor])
         return PepepowTx(
             version=version,
             inputs=inputs,
@@ -1,3 +1,9 @@
+import hashlib
+import threading
+import time
+
+import pytest
+
 import electrumx.lib.pepepow_hash as lib_pepepow_hash
 from electrumx.lib.coins import Coin, Pepepow
 from electrumx.lib.hash import hex_str_to_hash
@@ -111,3 +117,123 @@ def test_pepepow_genesis_block_hashes_with_height_zero(monkeypatch):
 
     assert Pepepow.genesis_block(block) == block + b"\0"
     assert heights == [0]
+
+
+def test_pepepow_aes_single_round_matches_fips197_round_one():
+    # FIPS-197 Appendix B: state at the start of round 1 and its round key.
+    block = bytearray.fromhex('193de3bea0f4e22b9ac68d2ae9f84808')
+    round_key = bytes.fromhex('a0fafe1788542cb123a339392a6c7605')
+    lib_pepepow_hash._aes_single_round(block, round_key)
+    assert block.hex() == 'a49c7ff2689f352b6b5bea43026a5049'
+
+
+def test_pepepow_chacha20_keystream_matches_rfc8439():
+    # RFC 8439 appendix A.1, test vector #1: all-zero key and nonce, counter 0.
+    keystream = lib_pepepow_hash._chacha20_encrypt_bytes(bytes(32), bytes(12), 64, rounds=20)
+    assert keystream.hex() == (
+        '76b8e0ada0f13d90405d6ae55386bd28bdd219b8a08ded1aa836efcc8b770dc7'
+        'da41597c5157488d7724e03fb8d84a376a43b8f41518a11cc387b669b2ee6586'
+    )
+
+
+class _FakeSphLibrary:
+    '''Stand-in for one libsph_* library, written against the ctypes buffers.
+
+    Each call yields the GIL so that threads sharing a context or output
+    buffer would corrupt each other's digests.
+    '''
+
+    def __init__(self, kind):
+        def init(ctx):
+            time.sleep(0)
+            ctx.raw = kind.encode().ljust(64, b"\x00")
+
+        def update(ctx, data, length):
+            data = bytes(data)[:length]
+            time.sleep(0)
+            ctx.raw = hashlib.sha512(ctx.raw[:64] + data).digest()
+
+        def close(ctx, out):
+            time.sleep(0)
+            out.raw = hashlib.sha512(ctx.raw[:64]).digest()
+
+        setattr(self, f"sph_{kind}512_init", init)
+        setattr(self, f"sph_{kind}512", update)
+        setattr(self, f"sph_{kind}512_close", close)
+
+
+def _fake_memehash(header):
+    digest = header
+    for kind in ("blake", "simd", "echo", "cubehash", "shavite"):
+        state = hashlib.sha512(kind.encode().ljust(64, b"\x00") + digest).digest()
+        digest = hashlib.sha512(state).digest()
+    digest = hashlib.sha256(digest).digest()
+    digest = hashlib.sha256(digest + bytes(32)).digest()
+    return hashlib.sha256(digest + bytes(32)).digest()
+
+
+def test_pepepow_memehash_batch_uses_per_thread_buffers(monkeypatch):
+    # Start from empty caches so the worker threads fill _SPH_FUNCS and
+    # their own _sph_buffers concurrently.
+    monkeypatch.setattr(lib_pepepow_hash, "_load_sph_library", _FakeSphLibrary)
+    monkeypatch.setattr(lib_pepepow_hash, "_SPH_FUNCS", {})
+    monkeypatch.setattr(lib_pepepow_hash, "_SPH_BUFFERS", threading.local())
+    headers = [bytes([n]) * 80 for n in range(64)]
+    expected = [_fake_memehash(header) for header in headers]
+
+    assert lib_pepepow_hash.pepepow_memehash_batch(headers, max_workers=4) == expected
+    assert lib_pepepow_hash.pepepow_memehash_batch(headers, max_workers=1) == expected
+    assert lib_pepepow_hash.pepepow_memehash_batch([]) == []
+
+
+@pytest.mark.parametrize("header, expected", [
+    (
+        bytes(range(80)),
+        '3aa28512939fc133eadd75d514ea0ce07df50b49ec82574d0e02ae88eb895b38',
+    ),
+    (
+        (0x8000).to_bytes(4, 'little') + b"\x5a" * 108,
+        '53707d38aa3cb7f3782b5a1330fd9b4521e4600a5b2d5269a2e14f42113aa95b',
+    ),
+])
+def test_pepepow_xelisv2_hash_known_answers(header, expected):
+    pytest.importorskip("blake3")
+    # Digests from the original per-operation implementation of stage 3.
+    # Hash twice so the reused per-thread scratch pad is covered as well.
+    assert lib_pepepow_hash.pepepow_xelisv2_hash(header).hex() == expected
+    assert lib_pepepow_hash.pepepow_xelisv2_hash(header).hex() == expected
+
+
+def test_pepepow_chacha8_multi_block_keystream():
+    # Xelis stage 1 draws 109824 bytes (1716 blocks) of 8-round keystream.
+    # Pinned to the output of the original scalar block function.
+    keystream = lib_pepepow_hash._chacha20_encrypt_bytes(
+        bytes(range(32)), bytes(range(12)), 109824, rounds=8
+    )
+    assert len(keystream) == 109824
+    assert keystream[:16].hex() == '2e214501d03825e75ac476151531939d'
+    assert hashlib.sha256(keystream).hexdigest() == (
+        '0cb40a241155965c4b7110fd13d36dad6b44b6d072724fb2482fcf1ed425c0c4'
+    )
+
+
+def test_pepepow_chacha20_encrypt_matches_rfc8439():
+    # RFC 8439 section 2.4.2. The vector starts at block counter 1 and ours
+    # starts at 0, so prefix a zero block and drop its output.
+    plaintext = (
+        b"Ladies and Gentlemen of the class of '99: If I could offer you only "
+        b"one tip for the future, sunscreen would be it."
+    )
+    out = lib_pepepow_hash._chacha20_encrypt_bytes(
+        bytes(range(32)), bytes.fromhex('000000000000004a00000000'),
+        64 + len(plaintext), rounds=20, in_data=bytes(64) + plaintext,
+    )
+    assert out[64:].hex() == (
+        '6e2e359a2568f98041ba0728dd0d6981e97e7aec1d4360c20a27afccfd9fae0b'
+        'f91b65c5524733ab8f593dabcd62b3571639d624e65152ab8f530c359f0861d8'
+        '07ca0dbf500d6a6156a38e088a22b65e52bc514d16ccf806818ce91ab7793736'
+        '5af90bbf74a35be6b40b8eedf2785e42874d'
+    )
+
+    with pytest.raises(ValueError):
+        lib_pepepow_hash._chacha20_encrypt_bytes(bytes(32), bytes(12), 65, 20, in_data=bytes(64))
@@ -1,6 +1,9 @@
 from electrumx.lib.hash import double_sha256
+from electrumx.lib.tx import Deserializer
 from electrumx.lib.tx_pepepow import DeserializerPepepow, PepepowTx
-from electrumx.lib.util import pack_le_uint32, pack_varint
+from electrumx.lib.util import (
+    pack_le_int64, pack_le_uint32, pack_varbytes, pack_varint,
+)
 
 
 def _minimal_spec_tx(*, tx_type: int, version: int, payload: bytes) -> bytes:
@@ -14,6 +17,40 @@ def _minimal_legacy_tx(version: int) -> bytes:
     return pack_le_uint32(version) + b'\x00\x00' + pack_le_uint32(0)
 
 
+def _legacy_tx_with_io() -> bytes:
+    inputs = [
+        bytes(range(32)) + pack_le_uint32(1) + pack_varbytes(b'\x51' * 107)
+        + pack_le_uint32(0xffffffff),
+        bytes(32) + pack_le_uint32(0xffffffff) + pack_varbytes(b'\x03abc')
+        + pack_le_uint32(0),
+    ]
+    outputs = [
+        pack_le_int64(5_000_000_000) + pack_varbytes(b'\x76\xa9' + b'\x14' * 23),
+        pack_le_int64(0) + pack_varbytes(b'\x6a' * 300),
+    ]
+    return (
+        pack_le_uint32(1)
+        + pack_varint(len(inputs)) + b''.join(inputs)
+        + pack_varint(len(outputs)) + b''.join(outputs)
+        + pack_le_uint32(0)
+    )
+
+
+def test_pepepow_inputs_outputs_match_base_deserializer():
+    raw_tx = _legacy_tx_with_io()
+    deser = DeserializerPepepow(raw_tx)
+    tx = deser.read_tx()
+    base = Deserializer(raw_tx).read_tx()
+
+    assert deser.cursor == len(raw_tx)
+    assert tx.inputs == base.inputs
+    assert tx.outputs == base.outputs
+    assert tx.inputs[1].is_generation()
+    assert len(tx.outputs[1].pk_script) == 300
+    assert tx.txid == base.txid
+    assert tx.serialize() == raw_tx
+
+
 def test_pepepow_unknown_spec_payload_falls_back_to_raw_bytes():
     raw_tx = _minimal_spec_tx(tx_type=187, version=3, payload=b'abc')
     deser = DeserializerPepepow(raw_tx)
@@ -54,3 +91,16 @@ def test_pepepow_known_spec_parse_failure_downgrades_to_raw_payload():
     assert tx.extra_payload == b'\xaa'
     assert deser.cursor == len(raw_tx)
     assert tx.txid == double_sha256(raw_tx)
+
+
+def test_pepepow_reset_reuses_deserializer():
+    first = _legacy_tx_with_io()
+    second = _minimal_spec_tx(tx_type=187, version=3, payload=b'abc')
+    deser = DeserializerPepepow(first)
+    assert deser.read_tx().txid == double_sha256(first)
+
+    deser.reset(second)
+    tx = deser.read_tx()
+    assert tx.tx_type == 187
+    assert tx.txid == double_sha256(second)
+    assert deser.cursor == len(second)